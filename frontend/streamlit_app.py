@@ -1,7 +1,11 @@
 # frontend/streamlit_app.py
 import streamlit as st
+import orjson
 import requests
-from typing import Dict, Any, List
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+from urllib3.util.retry import Retry
+from typing import Dict, Any, List, Iterator
 
 # --- Page and API Configuration ---
 st.set_page_config(
@@ -14,50 +18,123 @@ st.set_page_config(
 # The API base URL should point to where your FastAPI backend is running.
 API_BASE_URL = "http://127.0.0.1:8000"
 
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Creates one pooled HTTP session shared across reruns and user sessions."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=10,
+        max_retries=Retry(total=3, backoff_factor=0.3)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_session = get_http_session()
+
 # --- API Communication Functions ---
 
-def send_chat_message(query: str, session_id: str) -> Dict[str, Any]:
-    """Sends a chat message to the backend API."""
+def stream_chat_message(query: str, session_id: str, result: Dict[str, Any]) -> Iterator[str]:
+    """Streams a chat answer from the backend API, yielding text as it arrives.
+
+    The final event (success flag, full response and sources) is stored in `result`.
+    """
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/chat",
+        with _session.post(
+            f"{API_BASE_URL}/chat/stream",
             json={"query": query, "session_id": session_id},
-            timeout=45  # Increased timeout for potentially long-running generation
-        )
-        response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
-        return response.json()
-    except requests.exceptions.RequestException as e:
+            stream=True,
+            timeout=45  # Applies per read, so long generations keep streaming
+        ) as response:
+            response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = orjson.loads(line)
+                if event.get("type") == "token":
+                    yield event["content"]
+                else:
+                    result.update(event)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"Error communicating with API: {e}")
-        # Return a dictionary with a standard error format
-        return {"success": False, "response": "Failed to connect to the backend service."}
+        # Store a dictionary with a standard error format
+        result.update({"success": False, "response": "Failed to connect to the backend service."})
 
 def upload_file(file) -> Dict[str, Any]:
     """Uploads a file to the backend API."""
     try:
-        files = {"file": (file.name, file.getvalue(), file.type)}
-        response = requests.post(
+        # Stream the multipart body from the upload buffer instead of copying it
+        file.seek(0)
+        encoder = MultipartEncoder(fields={"file": (file.name, file, file.type)})
+        # stream=True defers reading the body until the status has been checked
+        with _session.post(
             f"{API_BASE_URL}/upload",
-            files=files,
+            data=encoder,
+            headers={"Content-Type": encoder.content_type},
+            stream=True,
             timeout=120  # Generous timeout for large files and processing
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        ) as response:
+            response.raise_for_status()
+            return orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"Error uploading file: {e}")
         return {"success": False, "message": "File upload failed due to a connection error."}
 
+class DocumentInfoUnavailable(Exception):
+    """Raised inside the cached fetch so failures are never cached."""
+
+@st.cache_data(ttl=30)
+def _fetch_document_info() -> Dict[str, Any]:
+    """Fetches document collection information, caching only successful results."""
+    try:
+        with _session.get(f"{API_BASE_URL}/documents/info", stream=True) as response:
+            response.raise_for_status()
+            info = orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+        raise DocumentInfoUnavailable() from e
+    if not info.get("success"):
+        raise DocumentInfoUnavailable()
+    return info
+
 def get_document_info() -> Dict[str, Any]:
     """Gets document collection information from the backend."""
     try:
-        response = requests.get(f"{API_BASE_URL}/documents/info")
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException:
+        return _fetch_document_info()
+    except DocumentInfoUnavailable:
         # Don't show an error for this, just return a non-success state
         return {"success": False}
 
 # --- UI Helper Functions ---
 
+@st.cache_data(max_entries=256)
+def format_sources(sources: List[Dict[str, Any]]) -> List[str]:
+    """Builds the markdown for each source once, so reruns reuse the cached text."""
+    blocks = []
+    for i, source in enumerate(sources, 1):
+        # Check if the source is from an internet search (has a URL)
+        if source.get("url"):
+            blocks.append(
+                f"**{i}. {source.get('title', 'Web Source')}**\n\n"
+                f"🔗 [{source['url']}]({source['url']})\n\n"
+                f"📝 *{source.get('snippet', 'No preview available')}*"
+            )
+        # Otherwise, assume it's a document source
+        else:
+            blocks.append(
+                f"**{i}. Document Source**\n\n"
+                f"📄 File: `{source.get('source', 'Unknown')}`\n\n"
+                f"📋 *Preview: {source.get('preview', 'No preview available')}*"
+            )
+    return blocks
+
+def display_sources(sources: List[Dict[str, Any]]):
+    """Displays the sources attached to a chat message."""
+    with st.expander("📚 Show Sources", expanded=False):
+        for block in format_sources(sources):
+            st.markdown(block)
+            st.divider()
+
 def display_message(message: Dict[str, Any]):
     """Displays a single chat message, including content and sources."""
     with st.chat_message(message["role"]):
@@ -65,19 +142,7 @@ def display_message(message: Dict[str, Any]):
         
         # Display sources if they exist in the message
         if "sources" in message and message["sources"]:
-            with st.expander("📚 Show Sources", expanded=False):
-                for i, source in enumerate(message["sources"], 1):
-                    # Check if the source is from an internet search (has a URL)
-                    if source.get("url"):
-                        st.markdown(f"**{i}. {source.get('title', 'Web Source')}**")
-                        st.markdown(f"🔗 [{source['url']}]({source['url']})")
-                        st.markdown(f"📝 *{source.get('snippet', 'No preview available')}*")
-                    # Otherwise, assume it's a document source
-                    else:
-                        st.markdown(f"**{i}. Document Source**")
-                        st.markdown(f"📄 File: `{source.get('source', 'Unknown')}`")
-                        st.markdown(f"📋 *Preview: {source.get('preview', 'No preview available')}*")
-                    st.divider()
+            display_sources(message["sources"])
 
 def initialize_session_state():
     """Initializes all necessary session state variables."""
@@ -136,6 +201,8 @@ def main():
                     if result.get("success"):
                         st.success(f"✅ {result.get('message', 'File processed.')}")
                         st.info(f"Created {result.get('chunks_created', 0)} text chunks.")
+                        # The collection changed, so drop the cached document info
+                        _fetch_document_info.clear()
                         # Add to our list of uploaded files for this session
                         if uploaded_file.name not in st.session_state.uploaded_files:
                             st.session_state.uploaded_files.append(uploaded_file.name)
@@ -145,14 +212,17 @@ def main():
         # --- Document Status ---
         st.subheader("🗂️ Document Status")
         if st.button("📊 Refresh Document Info"):
-            with st.spinner("Checking document collection..."):
-                doc_info = get_document_info()
-                if doc_info.get("success"):
-                    info = doc_info.get("info", {})
-                    st.write(f"**Total Chunks:** {info.get('count', 0)}")
-                    st.write(f"**Collection Name:** `{info.get('name', 'N/A')}`")
-                else:
-                    st.warning("Could not retrieve document info from the backend.")
+            # An explicit refresh must bypass the cache
+            _fetch_document_info.clear()
+        # Shown on every rerun; the cached fetch hits the backend at most every 30s
+        with st.spinner("Checking document collection..."):
+            doc_info = get_document_info()
+        if doc_info.get("success"):
+            info = doc_info.get("info", {})
+            st.write(f"**Total Chunks:** {info.get('count', 0)}")
+            st.write(f"**Collection Name:** `{info.get('name', 'N/A')}`")
+        else:
+            st.warning("Could not retrieve document info from the backend.")
 
         if st.session_state.uploaded_files:
             with st.expander("View Uploaded Files", expanded=False):
@@ -172,21 +242,24 @@ def main():
         st.session_state.messages.append({"role": "user", "content": user_prompt})
         display_message({"role": "user", "content": user_prompt})
         
-        # Get and display the AI's response
-        with st.spinner("Thinking..."):
-            ai_response = send_chat_message(user_prompt, st.session_state.session_id)
-            if ai_response.get("success"):
+        # Stream the AI's response as it is generated
+        with st.chat_message("assistant"):
+            stream_result: Dict[str, Any] = {}
+            streamed_text = st.write_stream(
+                stream_chat_message(user_prompt, st.session_state.session_id, stream_result)
+            )
+            if stream_result.get("success"):
                 assistant_message = {
                     "role": "assistant",
-                    "content": ai_response["response"],
-                    "sources": ai_response.get("sources", [])
+                    "content": stream_result.get("response") or streamed_text,
+                    "sources": stream_result.get("sources", [])
                 }
                 # Add the AI's full response to the session state
                 st.session_state.messages.append(assistant_message)
-                # Rerender the new AI message from the session state
-                display_message(assistant_message)
+                if assistant_message["sources"]:
+                    display_sources(assistant_message["sources"])
             else:
-                st.error(ai_response.get("response", "An unknown error occurred."))
+                st.error(stream_result.get("response", "An unknown error occurred."))
 
 
 if __name__ == "__main__":
@@ -1,19 +1,49 @@
+import asyncio
 import logging
-from typing import Dict, Any, List, TypedDict
-from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
+import re
+from functools import cached_property, lru_cache
+from typing import TYPE_CHECKING, Dict, Any, List, TypedDict, AsyncIterator
 from src.agents.search_agent import SearchAgent
 from src.agents.document_agent import DocumentAgent
-from src.utils.memory_manager import ConversationMemoryManager
+from src.utils.memory_manager import memory_store
+from src.utils.llm_client import get_llm, get_router_llm, LLM_SEMAPHORE
+from src.utils.query_cache import LRUCache, normalize_query_key
 from src.config.settings import settings
 
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_openai import ChatOpenAI
+    from langgraph.graph import StateGraph
+
 logger = logging.getLogger(__name__)
 
+# Graph nodes whose LLM output is the final answer shown to the user. The
+# search/documents nodes qualify because combine reuses a single-source answer.
+FINAL_RESPONSE_NODES = {"search", "documents", "direct", "combine"}
+
+# LLM routing decisions keyed on the normalized query, shared by all sessions.
+# Only first turns are cached, since later decisions depend on the history.
+_routing_cache = LRUCache(settings.routing_cache_size)
+
+@lru_cache(maxsize=None)
+def _chat_prompt(system_template: str, human_template: str) -> "ChatPromptTemplate":
+    """Build a system + history + user chat prompt once per template pair."""
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    return ChatPromptTemplate.from_messages([
+        ("system", system_template),
+        MessagesPlaceholder("history"),
+        ("human", human_template)
+    ])
+
+# Messages that are nothing but a greeting or thanks, e.g. "Hi!" or "thank you."
+GREETING_PATTERN = re.compile(r"^\s*(hi|hello|hey|thanks|thank you|bye)[\s!.,]*$", re.IGNORECASE)
+
 class ChatState(TypedDict):
     query: str
     response: str
     chat_history: str
+    history_messages: List["BaseMessage"]
     needs_search: bool
     needs_documents: bool
     search_results: Dict[str, Any]
@@ -22,59 +52,85 @@ class ChatState(TypedDict):
     sources: List[Dict[str, Any]]
 
 class ChatAgent:
+    # Prompts are split into a static system message, the conversation history
+    # and a per-turn user message, so the provider can cache the shared prefix.
+
+    # Routing prompt
+    _ROUTING_SYSTEM = """Analyze the user's query and determine what actions are needed.
+Determine if the query needs:
+1. Internet search (for current information, facts, news, general knowledge)
+2. Document search (for information from uploaded documents)
+3. Direct response (for casual conversation, greetings, simple questions)
+
+Respond with exactly one of: "SEARCH", "DOCUMENTS", "DIRECT", "BOTH"
+"""
+    _ROUTING_HUMAN = """Available Documents: {has_documents}
+User Query: {query}
+Decision:"""
+
+    # Final response prompt
+    _FINAL_SYSTEM = """You are a helpful AI assistant. Based on the information gathered, provide a comprehensive response to the user's query.
+Provide a helpful, accurate, and well-structured response. If you used multiple sources, integrate the information coherently. Always be honest about the limitations of your knowledge."""
+    _FINAL_HUMAN = """User Query: {query}
+Search Information: {search_info}
+Document Information: {document_info}"""
+
+    # Direct response prompt
+    _DIRECT_SYSTEM = "Based on the conversation history, provide a helpful response to the user's query."
+    _DIRECT_HUMAN = "{query}"
+
     def __init__(self, session_id: str):
         self.session_id = session_id
-        self.memory_manager = ConversationMemoryManager(session_id)
+        self.memory_manager = memory_store.get_session_memory(session_id)
         self.search_agent = SearchAgent()
         self.document_agent = DocumentAgent()
-        self.llm = ChatOpenAI(
-            openai_api_key=settings.openai_api_key,
-            model_name=settings.llm_model,
-            temperature=settings.temperature
-        )
         # Build the conversation graph
         self.graph = self._build_graph()
-        # Routing prompt
-        self.routing_prompt = PromptTemplate(
-            input_variables=["query", "chat_history", "has_documents"],
-            template=""" Analyze the user's query and determine what actions are needed.
-            Chat History: {chat_history}
-            User Query: {query}
-            Available Documents: {has_documents}
-
-            Determine if the query needs:
-            1. Internet search (for current information, facts, news, general knowledge)
-            2. Document search (for information from uploaded documents)
-            3. Direct response (for casual conversation, greetings, simple questions)
-
-            Respond with exactly one of: "SEARCH", "DOCUMENTS", "DIRECT", "BOTH"
-            Decision: """
-        )
-        # Final response prompt
-        self.final_prompt = PromptTemplate(
-            input_variables=["query", "chat_history", "search_info", "document_info"],
-            template=""" You are a helpful AI assistant. Based on the information gathered, provide a comprehensive response to the user's query.
-            Chat History: {chat_history}
-            User Query: {query}
-            Search Information: {search_info}
-            Document Information: {document_info}
-
-            Provide a helpful, accurate, and well-structured response. If you used multiple sources, integrate the information coherently. Always be honest about the limitations of your knowledge.
-            Response: """
-        )
 
-    def _build_graph(self) -> StateGraph:
+    @cached_property
+    def llm(self) -> "ChatOpenAI":
+        return get_llm()
+
+    @cached_property
+    def router_llm(self) -> "ChatOpenAI":
+        return get_router_llm()
+
+    def _build_graph(self) -> "StateGraph":
         """Build the LangGraph conversation flow."""
-        def route_query(state: ChatState) -> str:
+        from langgraph.graph import StateGraph, END
+
+        async def route_query(state: ChatState) -> str:
             """Determine the appropriate action based on the query."""
             try:
-                has_docs = self.document_agent.has_documents()
-                prompt = self.routing_prompt.format(
-                    query=state["query"],
-                    chat_history=state["chat_history"],
-                    has_documents=has_docs
-                )
-                decision = self.llm.invoke(prompt).content.strip().upper()
+                query = state["query"]
+                if GREETING_PATTERN.match(query):
+                    return "direct"
+
+                needs_search = self.search_agent.should_search(query)
+                # May count the collection on a cache miss, so keep it off the loop
+                has_docs = await asyncio.to_thread(self.document_agent.has_documents)
+                if needs_search:
+                    return "both" if has_docs else "search"
+                if has_docs:
+                    return "documents"
+                if len(query) < settings.router_llm_min_query_length:
+                    return "direct"
+
+                # Ambiguous query: fall back to the LLM router
+                cacheable = not state["history_messages"]
+                cache_key = normalize_query_key(query)
+                decision = _routing_cache.get(cache_key) if cacheable else None
+                if decision is None:
+                    prompt = _chat_prompt(self._ROUTING_SYSTEM, self._ROUTING_HUMAN).format_messages(
+                        history=state["history_messages"],
+                        query=query,
+                        has_documents=has_docs
+                    )
+                    async with LLM_SEMAPHORE:
+                        response = await self.router_llm.ainvoke(prompt)
+                    decision = response.content.strip().upper()
+                    if cacheable:
+                        _routing_cache.set(cache_key, decision)
                 if "SEARCH" in decision:
                     return "search"
                 elif "DOCUMENTS" in decision:
@@ -87,10 +143,10 @@ class ChatAgent:
                 logger.error(f"Error in routing: {str(e)}")
                 return "direct"
 
-        def search_node(state: ChatState) -> ChatState:
+        async def search_node(state: ChatState) -> ChatState:
             """Perform internet search."""
             try:
-                search_results = self.search_agent.search_and_respond(state["query"])
+                search_results = await self.search_agent.search_and_respond(state["query"])
                 state["search_results"] = search_results
                 state["needs_search"] = True
                 return state
@@ -99,10 +155,10 @@ class ChatAgent:
                 state["search_results"] = {"success": False, "response": "Search failed"}
                 return state
 
-        def document_node(state: ChatState) -> ChatState:
+        async def document_node(state: ChatState) -> ChatState:
             """Query documents."""
             try:
-                doc_results = self.document_agent.query_documents(
+                doc_results = await self.document_agent.query_documents(
                     state["query"], state["chat_history"]
                 )
                 state["document_results"] = doc_results
@@ -113,20 +169,29 @@ class ChatAgent:
                 state["document_results"] = {"success": False, "response": "Document query failed"}
                 return state
 
-        def both_node(state: ChatState) -> ChatState:
-            """Perform both search and document query."""
-            state = search_node(state)
-            state = document_node(state)
+        async def both_node(state: ChatState) -> ChatState:
+            """Perform both search and document query concurrently."""
+            # A TaskGroup cancels the other branch if one fails; each branch gets
+            # its own copy of the state so they never write to the same dict
+            async with asyncio.TaskGroup() as tg:
+                search_task = tg.create_task(search_node(state.copy()))
+                document_task = tg.create_task(document_node(state.copy()))
+            search_state, document_state = search_task.result(), document_task.result()
+            state["search_results"] = search_state["search_results"]
+            state["needs_search"] = search_state["needs_search"]
+            state["document_results"] = document_state["document_results"]
+            state["needs_documents"] = document_state["needs_documents"]
             return state
 
-        def direct_response_node(state: ChatState) -> ChatState:
+        async def direct_response_node(state: ChatState) -> ChatState:
             """Generate direct response without external sources."""
             try:
-                direct_prompt = f""" Based on the conversation history, provide a helpful response to the user's query.
-Chat History: {state["chat_history"]}
-User Query: {state["query"]}
-Response: """
-                response = self.llm.invoke(direct_prompt)
+                direct_prompt = _chat_prompt(self._DIRECT_SYSTEM, self._DIRECT_HUMAN).format_messages(
+                    history=state["history_messages"],
+                    query=state["query"]
+                )
+                async with LLM_SEMAPHORE:
+                    response = await self.llm.ainvoke(direct_prompt)
                 state["final_response"] = response.content.strip()
                 state["sources"] = []
                 return state
@@ -135,7 +200,7 @@ Response: """
                 state["final_response"] = "I apologize, but I encountered an error processing your request."
                 return state
 
-        def combine_results_node(state: ChatState) -> ChatState:
+        async def combine_results_node(state: ChatState) -> ChatState:
             """Combine results from different sources."""
             try:
                 search_info = ""
@@ -144,26 +209,38 @@ Response: """
                 if state.get("search_results", {}).get("success"):
                     search_info = state["search_results"]["response"]
                     sources.extend(state["search_results"].get("sources", []))
-                if state.get("document_results", {}).get("success"):
-                    document_info = state["document_results"]["response"]
-                    sources.extend(state["document_results"].get("sources", []))
+                document_results = state.get("document_results", {})
+                # Without sources the agent only says nothing relevant was found,
+                # which is no answer to reuse or merge
+                if (document_results.get("success") and document_results.get("documents_found")
+                        and document_results.get("sources")):
+                    document_info = document_results["response"]
+                    sources.extend(document_results["sources"])
 
                 if not search_info and not document_info:
-                    return direct_response_node(state)
+                    return await direct_response_node(state)
 
-                prompt = self.final_prompt.format(
+                # A single source already produced a finished LLM answer, so
+                # only synthesize when there are two different answers to merge
+                if not (search_info and document_info) or search_info == document_info:
+                    state["final_response"] = search_info or document_info
+                    state["sources"] = sources
+                    return state
+
+                prompt = _chat_prompt(self._FINAL_SYSTEM, self._FINAL_HUMAN).format_messages(
+                    history=state["history_messages"],
                     query=state["query"],
-                    chat_history=state["chat_history"],
                     search_info=search_info,
                     document_info=document_info
                 )
-                response = self.llm.invoke(prompt)
+                async with LLM_SEMAPHORE:
+                    response = await self.llm.ainvoke(prompt)
                 state["final_response"] = response.content.strip()
                 state["sources"] = sources
                 return state
             except Exception as e:
                 logger.error(f"Error combining results: {str(e)}")
-                return direct_response_node(state)
+                return await direct_response_node(state)
 
         # Build the graph
         workflow = StateGraph(ChatState)
@@ -195,28 +272,29 @@ Response: """
         
         return workflow.compile()
 
-    def chat(self, query: str) -> Dict[str, Any]:
+    def _initial_state(self, query: str) -> ChatState:
+        """Create the initial graph state for a query."""
+        return {
+            "query": query,
+            "response": "",
+            "chat_history": self.memory_manager.get_formatted_history(),
+            "history_messages": list(self.memory_manager.get_conversation_history()),
+            "needs_search": False,
+            "needs_documents": False,
+            "search_results": {},
+            "document_results": {},
+            "final_response": "",
+            "sources": []
+        }
+
+    async def chat(self, query: str) -> Dict[str, Any]:
         """Process user query through the conversation graph."""
         try:
             logger.info(f"Processing query for session {self.session_id}: {query}")
-            # Get conversation history
-            chat_history = self.memory_manager.get_formatted_history()
-            
-            # Create initial state
-            initial_state: ChatState = {
-                "query": query,
-                "response": "",
-                "chat_history": chat_history,
-                "needs_search": False,
-                "needs_documents": False,
-                "search_results": {},
-                "document_results": {},
-                "final_response": "",
-                "sources": []
-            }
+            initial_state = self._initial_state(query)
             
             # Run the graph
-            result = self.graph.invoke(initial_state)
+            result = await self.graph.ainvoke(initial_state)
             
             # Extract final response and sources
             final_response = result.get("final_response", "I apologize, but I couldn't process your request.")
@@ -242,6 +320,56 @@ Response: """
                 "session_id": self.session_id
             }
 
+    async def chat_stream(self, query: str) -> AsyncIterator[Dict[str, Any]]:
+        """Process user query, yielding answer tokens as they are generated.
+
+        Yields ``{"type": "token", "content": ...}`` events followed by one
+        ``{"type": "done", ...}`` event carrying the same fields as ``chat``.
+        """
+        try:
+            logger.info(f"Streaming query for session {self.session_id}: {query}")
+            initial_state = self._initial_state(query)
+
+            result: Dict[str, Any] = {}
+            streamed = False
+            async for mode, payload in self.graph.astream(
+                initial_state, stream_mode=["messages", "values"]
+            ):
+                if mode == "values":
+                    result = payload
+                    continue
+                chunk, metadata = payload
+                # Skip tokens from routing and from the search/document agents
+                if metadata.get("langgraph_node") in FINAL_RESPONSE_NODES and chunk.content:
+                    streamed = True
+                    yield {"type": "token", "content": chunk.content}
+
+            final_response = result.get("final_response") or "I apologize, but I couldn't process your request."
+            if not streamed:
+                # The final node did not call the LLM, so send the answer in one piece
+                yield {"type": "token", "content": final_response}
+
+            self.memory_manager.add_user_message(query)
+            self.memory_manager.add_ai_message(final_response)
+
+            logger.info(f"Streamed response for session {self.session_id}")
+            yield {
+                "type": "done",
+                "success": True,
+                "response": final_response,
+                "sources": result.get("sources", []),
+                "session_id": self.session_id
+            }
+        except Exception as e:
+            logger.error(f"Error in streaming chat processing: {str(e)}")
+            yield {
+                "type": "done",
+                "success": False,
+                "response": f"I encountered an error: {str(e)}",
+                "sources": [],
+                "session_id": self.session_id
+            }
+
     def clear_conversation(self):
         """Clear conversation memory."""
         self.memory_manager.clear_memory()
@@ -1,39 +1,38 @@
 import logging
-from typing import Dict, Any, List
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.schema import Document
-from src.utils.vector_store import VectorStoreManager
+from functools import cached_property
+from typing import TYPE_CHECKING, Dict, Any, List, Tuple
+from src.utils.vector_store import get_vector_store
+from src.utils.llm_client import get_llm, LLM_SEMAPHORE
 from src.config.settings import settings
 
+if TYPE_CHECKING:
+    from langchain.schema import Document
+    from langchain_openai import ChatOpenAI
+
 logger = logging.getLogger(__name__)
 
 class DocumentAgent:
-    def __init__(self):
-        self.vector_store_manager = VectorStoreManager()
-        self.llm = ChatOpenAI(
-            openai_api_key=settings.openai_api_key,
-            model_name=settings.llm_model,
-            temperature=settings.temperature
-        )
-        self.document_prompt = PromptTemplate(
-            input_variables=["query", "context", "chat_history"],
-            template=""" You are a helpful assistant that answers questions based on uploaded documents and conversation history.
+    # Document question answering prompt
+    _DOCUMENT_TEMPLATE = """ You are a helpful assistant that answers questions based on uploaded documents and conversation history.
             Chat History: {chat_history}
             Context from Documents: {context}
             User Question: {query}
             Please provide a comprehensive answer based on the document context. If the information is not available in the documents, clearly state that. Always cite which document or section your information comes from when possible.
             Answer: """
-        )
 
-    def query_documents(self, query: str, chat_history: str = "") -> Dict[str, Any]:
+    def __init__(self):
+        self.vector_store_manager = get_vector_store()
+
+    @cached_property
+    def llm(self) -> "ChatOpenAI":
+        return get_llm()
+
+    async def query_documents(self, query: str, chat_history: str = "") -> Dict[str, Any]:
         """Query documents using vector similarity search."""
         try:
             logger.info(f"Querying documents for: {query}")
             # Perform similarity search
-            relevant_docs = self.vector_store_manager.similarity_search_with_score(
-                query, k=5
-            )
+            relevant_docs = await self.vector_store_manager.asimilarity_search_with_score(query, k=5)
             if not relevant_docs:
                 return {
                     "success": True,
@@ -42,12 +41,10 @@ class DocumentAgent:
                     "documents_found": False
                 }
 
-            # Filter documents by relevance score (threshold: 0.8)
-            filtered_docs = [
-                (doc, score) for doc, score in relevant_docs if score < 0.8
-                # Lower score means higher similarity in some implementations
-            ]
-            if not filtered_docs:
+            # Filter by relevance score (threshold: 0.8) and build context and
+            # sources in a single pass. Lower score means higher similarity.
+            context, sources = self._prepare_context_and_sources(relevant_docs, 0.8)
+            if not sources:
                 return {
                     "success": True,
                     "response": "I couldn't find sufficiently relevant information in the uploaded documents to answer your question.",
@@ -55,17 +52,14 @@ class DocumentAgent:
                     "documents_found": True
                 }
 
-            # Prepare context from documents
-            context = self._prepare_context(filtered_docs)
             # Generate response
-            prompt = self.document_prompt.format(
+            prompt = self._DOCUMENT_TEMPLATE.format(
                 query=query,
                 context=context,
                 chat_history=chat_history
             )
-            response = self.llm.invoke(prompt)
-            # Prepare source information
-            sources = self._prepare_sources(filtered_docs)
+            async with LLM_SEMAPHORE:
+                response = await self.llm.ainvoke(prompt)
             logger.info(f"Generated document-based response for: {query}")
             return {
                 "success": True,
@@ -82,11 +76,11 @@ class DocumentAgent:
                 "documents_found": False
             }
 
-    def add_documents(self, documents: List[Document]) -> Dict[str, Any]:
+    async def add_documents(self, documents: List["Document"]) -> Dict[str, Any]:
         """Add documents to the vector store."""
         try:
             logger.info(f"Adding {len(documents)} documents to vector store")
-            document_ids = self.vector_store_manager.add_documents(documents)
+            document_ids = await self.vector_store_manager.aadd_documents(documents)
             return {
                 "success": True,
                 "message": f"Successfully added {len(documents)} document chunks",
@@ -103,7 +97,7 @@ class DocumentAgent:
     def get_collection_info(self) -> Dict[str, Any]:
         """Get information about stored documents."""
         try:
-            info = self.vector_store_manager.get_collection_info()
+            info = self._get_cached_collection_info()
             return {
                 "success": True,
                 "info": info
@@ -116,34 +110,40 @@ class DocumentAgent:
                 "error": str(e)
             }
 
-    def _prepare_context(self, docs_with_scores: List[tuple]) -> str:
-        """Prepare context string from relevant documents."""
-        context = ""
-        for i, (doc, score) in enumerate(docs_with_scores, 1):
-            source = doc.metadata.get("source", "Unknown")
-            chunk_id = doc.metadata.get("chunk_id", 0)
-            context += f"Document {i} (Source: {source}, Chunk: {chunk_id}):\n"
-            context += f"{doc.page_content}\n\n"
-        return context
-
-    def _prepare_sources(self, docs_with_scores: List[tuple]) -> List[Dict[str, Any]]:
-        """Prepare source information for response."""
+    def _prepare_context_and_sources(
+        self, docs_with_scores: List[tuple], score_threshold: float
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Prepare context string and source information from relevant documents."""
+        context_parts = []
         sources = []
         for doc, score in docs_with_scores:
-            source_info = {
-                "source": doc.metadata.get("source", "Unknown"),
-                "chunk_id": doc.metadata.get("chunk_id", 0),
+            if score >= score_threshold:
+                continue
+            source = doc.metadata.get("source", "Unknown")
+            chunk_id = doc.metadata.get("chunk_id", 0)
+            content = doc.page_content
+            context_parts.append(
+                f"Document {len(sources) + 1} (Source: {source}, Chunk: {chunk_id}):\n{content}\n\n"
+            )
+            sources.append({
+                "source": source,
+                "chunk_id": chunk_id,
                 "file_type": doc.metadata.get("file_type", "unknown"),
                 "relevance_score": float(score),
-                "preview": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
-            }
-            sources.append(source_info)
-        return sources
+                "preview": content[:200] + "..." if len(content) > 200 else content
+            })
+        return "".join(context_parts), sources
+
+    def _get_cached_collection_info(self) -> Dict[str, Any]:
+        """Return collection info, hitting the vector store at most once per TTL."""
+        return self.vector_store_manager.get_collection_info(
+            max_age=settings.collection_info_cache_ttl
+        )
 
     def has_documents(self) -> bool:
         """Check if there are any documents in the vector store."""
         try:
-            info = self.vector_store_manager.get_collection_info()
+            info = self._get_cached_collection_info()
             return info.get("count", 0) > 0
         except Exception:
             return False
\ No newline at end of file
@@ -1,23 +1,33 @@
+import asyncio
 import logging
-from typing import Dict, Any, List
-from tavily import TavilyClient
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
+import re
+from functools import cached_property
+from typing import TYPE_CHECKING, Dict, Any, List
+from src.utils.llm_client import get_llm, LLM_SEMAPHORE
 from src.config.settings import settings
 
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+    from tavily import TavilyClient
+
 logger = logging.getLogger(__name__)
 
+# Phrases that suggest the query needs fresh information from the web
+SEARCH_INDICATORS = [
+    "what is", "who is", "when did", "where is", "how to",
+    "latest", "recent", "current", "news", "update", "weather",
+    "stock price", "market", "today", "happening now", "breaking"
+]
+SEARCH_PATTERN = re.compile(
+    r"\b(" + "|".join(map(re.escape, SEARCH_INDICATORS)) + r")\b", re.IGNORECASE
+)
+
+# Tavily has its own quota, separate from the OpenAI limit
+SEARCH_SEMAPHORE = asyncio.Semaphore(settings.search_max_concurrency)
+
 class SearchAgent:
-    def __init__(self):
-        self.tavily_client = TavilyClient(api_key=settings.tavily_api_key)
-        self.llm = ChatOpenAI(
-            openai_api_key=settings.openai_api_key,
-            model_name=settings.llm_model,
-            temperature=settings.temperature
-        )
-        self.search_prompt = PromptTemplate(
-            input_variables=["query", "search_results"],
-            template=""" Based on the user's query and the search results below, provide a comprehensive and accurate answer.
+    # Search result synthesis prompt
+    _SEARCH_TEMPLATE = """ Based on the user's query and the search results below, provide a comprehensive and accurate answer.
             User Query: {query}
             Search Results: {search_results}
             Please provide a well-structured response that:
@@ -26,14 +36,22 @@ class SearchAgent:
             3. Cites sources when appropriate
             4. Is clear and concise
             Response: """
-        )
 
-    def search_and_respond(self, query: str) -> Dict[str, Any]:
+    @cached_property
+    def tavily_client(self) -> "TavilyClient":
+        from tavily import TavilyClient
+        return TavilyClient(api_key=settings.tavily_api_key)
+
+    @cached_property
+    def llm(self) -> "ChatOpenAI":
+        return get_llm()
+
+    async def search_and_respond(self, query: str) -> Dict[str, Any]:
         """Perform internet search and generate response."""
         try:
             logger.info(f"Performing search for query: {query}")
             # Perform search
-            search_results = self._perform_search(query)
+            search_results = await self._perform_search(query)
             if not search_results:
                 return {
                     "success": False,
@@ -43,11 +61,12 @@ class SearchAgent:
             # Format search results for prompt
             formatted_results = self._format_search_results(search_results)
             # Generate response using LLM
-            prompt = self.search_prompt.format(
+            prompt = self._SEARCH_TEMPLATE.format(
                 query=query,
                 search_results=formatted_results
             )
-            response = self.llm.invoke(prompt)
+            async with LLM_SEMAPHORE:
+                response = await self.llm.ainvoke(prompt)
             # Extract sources
             sources = [
                 {
@@ -73,14 +92,17 @@ class SearchAgent:
                 "search_performed": False
             }
 
-    def _perform_search(self, query: str) -> List[Dict[str, Any]]:
+    async def _perform_search(self, query: str) -> List[Dict[str, Any]]:
         """Perform search using Tavily API."""
         try:
-            response = self.tavily_client.search(
-                query=query,
-                max_results=settings.max_search_results,
-                search_depth="advanced"
-            )
+            # TavilyClient is synchronous; keep it off the event loop
+            async with SEARCH_SEMAPHORE:
+                response = await asyncio.to_thread(
+                    self.tavily_client.search,
+                    query=query,
+                    max_results=settings.max_search_results,
+                    search_depth="advanced"
+                )
             return response.get("results", [])
         except Exception as e:
             logger.error(f"Error performing Tavily search: {str(e)}")
@@ -100,10 +122,4 @@ class SearchAgent:
 
     def should_search(self, query: str, context: str = "") -> bool:
         """Determine if a search is needed for the query."""
-        search_indicators = [
-            "what is", "who is", "when did", "where is", "how to",
-            "latest", "recent", "current", "news", "update", "weather",
-            "stock price", "market", "today", "happening now", "breaking"
-        ]
-        query_lower = query.lower()
-        return any(indicator in query_lower for indicator in search_indicators)
\ No newline at end of file
+        return bool(SEARCH_PATTERN.search(query))
\ No newline at end of file
@@ -1,15 +1,23 @@
 import os
+import asyncio
 import logging
 import uuid
+from collections import OrderedDict
+from pathlib import PurePath
+from contextlib import asynccontextmanager
 from typing import List
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import aiofiles
+import orjson
 from src.agents.chat_agent import ChatAgent
 from src.agents.document_agent import DocumentAgent
-from src.utils.document_processor import DocumentProcessor
+from src.utils.document_processor import DocumentProcessor, shutdown_pdf_pool
 from src.utils.memory_manager import memory_store
+from src.utils.vector_store import get_vector_store
 from src.api.models import ChatRequest, ChatResponse, FileUploadResponse, SessionInfo
 from src.config.settings import settings
 
@@ -17,13 +25,67 @@ from src.config.settings import settings
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Read size used when saving uploaded files to disk
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# File types DocumentProcessor can extract text from
+_ALLOWED_EXT = frozenset({'.pdf', '.docx', '.txt', '.csv', '.xlsx'})
+
+async def evict_idle_sessions():
+    """Periodically drop sessions and their agents once they have been idle too long."""
+    while True:
+        await asyncio.sleep(settings.session_eviction_interval)
+        try:
+            idle = memory_store.evict_idle_sessions(settings.session_idle_ttl)
+            async with _agents_lock:
+                for session_id in idle:
+                    _agents.pop(session_id, None)
+        except Exception as e:
+            logger.error(f"Error evicting idle sessions: {str(e)}")
+
+async def persist_vector_store():
+    """Periodically write pending FAISS inserts to disk."""
+    while True:
+        await asyncio.sleep(settings.faiss_save_interval)
+        try:
+            await asyncio.to_thread(get_vector_store().save_index)
+        except Exception as e:
+            logger.error(f"Error saving vector index: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background_tasks = [asyncio.create_task(evict_idle_sessions())]
+    if settings.vector_backend == "faiss":
+        background_tasks.append(asyncio.create_task(persist_vector_store()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.to_thread(get_vector_store().save_index)
+    shutdown_pdf_pool()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="LangGraph Chatbot API",
     description="Intelligent chatbot with search and document processing capabilities",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    """GZip that passes the token stream through uncompressed.
+
+    The compressor buffers small writes, which would hold streamed tokens back.
+    """
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/chat/stream":
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Compress larger JSON payloads such as answers with many sources
+app.add_middleware(StreamingAwareGZipMiddleware, minimum_size=1024)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -37,33 +99,64 @@ app.add_middleware(
 document_processor = DocumentProcessor()
 document_agent = DocumentAgent()
 
+# Chat agents are reused per session; least recently used ones are evicted
+MAX_CACHED_AGENTS = 1000
+_agents: "OrderedDict[str, ChatAgent]" = OrderedDict()
+_agents_lock = asyncio.Lock()
+
 # Ensure upload directory exists
 os.makedirs(settings.upload_path, exist_ok=True)
 
+async def get_chat_agent(session_id: str) -> ChatAgent:
+    """Get the cached chat agent for a session, creating it on first use."""
+    async with _agents_lock:
+        chat_agent = _agents.get(session_id)
+        if chat_agent is not None:
+            _agents.move_to_end(session_id)
+            return chat_agent
+    # Setup opens the vector store, so build the agent off the event loop
+    new_agent = await run_in_threadpool(ChatAgent, session_id)
+    async with _agents_lock:
+        chat_agent = _agents.setdefault(session_id, new_agent)
+        _agents.move_to_end(session_id)
+        while len(_agents) > MAX_CACHED_AGENTS:
+            _agents.popitem(last=False)
+    return chat_agent
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     """Main chat endpoint."""
     try:
         # Get or create chat agent for session
-        chat_agent = ChatAgent(request.session_id)
+        chat_agent = await get_chat_agent(request.session_id)
         # Process the query
-        result = chat_agent.chat(request.query)
+        result = await chat_agent.chat(request.query)
         return ChatResponse(**result)
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Chat endpoint streaming the answer as newline-delimited JSON events."""
+    chat_agent = await get_chat_agent(request.session_id)
+
+    async def event_stream():
+        async for event in chat_agent.chat_stream(request.query):
+            yield orjson.dumps(event) + b"\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 @app.post("/upload", response_model=FileUploadResponse)
 async def upload_file(file: UploadFile = File(...)):
     """Upload and process document files."""
     try:
         # Validate file type
-        allowed_extensions = {'.pdf', '.docx', '.txt', '.csv', '.xlsx'}
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        if file_extension not in allowed_extensions:
+        file_extension = PurePath(file.filename).suffix.lower()
+        if file_extension not in _ALLOWED_EXT:
             raise HTTPException(
                 status_code=400,
-                detail=f"Unsupported file type. Allowed: {allowed_extensions}"
+                detail=f"Unsupported file type. Allowed: {', '.join(sorted(_ALLOWED_EXT))}"
             )
 
         # Generate unique filename
@@ -71,16 +164,16 @@ async def upload_file(file: UploadFile = File(...)):
         filename = f"{file_id}_{file.filename}"
         file_path = os.path.join(settings.upload_path, filename)
 
-        # Save file
+        # Save file in 1 MiB chunks so memory use does not grow with file size
         async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await f.write(chunk)
 
-        # Process file
-        documents = document_processor.process_file(file_path)
+        # Process file; extraction is CPU-bound, so keep it off the event loop
+        documents = await run_in_threadpool(document_processor.process_file, file_path)
 
         # Add to vector store
-        result = document_agent.add_documents(documents)
+        result = await document_agent.add_documents(documents)
         
         if result["success"]:
             return FileUploadResponse(
@@ -122,6 +215,8 @@ async def clear_session(session_id: str):
     """Clear specific session memory."""
     try:
         memory_store.clear_session(session_id)
+        async with _agents_lock:
+            _agents.pop(session_id, None)
         return {"message": f"Session {session_id} cleared successfully"}
     except Exception as e:
         logger.error(f"Error clearing session: {str(e)}")
@@ -131,7 +226,7 @@ async def clear_session(session_id: str):
 async def get_documents_info():
     """Get information about stored documents."""
     try:
-        info = document_agent.get_collection_info()
+        info = await run_in_threadpool(document_agent.get_collection_info)
         return info
     except Exception as e:
         logger.error(f"Error getting document info: {str(e)}")
@@ -143,5 +238,16 @@ async def health_check():
     return {"status": "healthy", "service": "LangGraph Chatbot API"}
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvloop and httptools come with uvicorn[standard]; uvloop has no Windows build
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    # Workers need an import string so each process builds its own app
+    uvicorn.run(
+        "src.api.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=settings.api_workers,
+        loop=loop,
+        http="httptools"
+    )
\ No newline at end of file
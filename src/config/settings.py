@@ -1,5 +1,6 @@
 import os
-from typing import Optional
+from typing import Optional, Literal
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -7,25 +8,63 @@ class Settings(BaseSettings):
     openai_api_key: str
     tavily_api_key: str
 
+    # Server
+    # Sessions, agents and the vector index live in process memory. More
+    # than one worker needs Chroma running as a separate server; the FAISS
+    # index is a per-process file and is rejected with multiple workers.
+    api_workers: int = 1
+
     # Database
+    vector_backend: Literal["chroma", "faiss"] = "chroma"
+    # Seconds between writes of pending FAISS inserts to disk
+    faiss_save_interval: int = 60
+    # Store FAISS vectors as int8 codes once enough vectors exist to train on
+    faiss_int8_quantization: bool = True
     vector_db_path: str = "./data/vector_db"
     upload_path: str = "./data/uploads"
+    collection_info_cache_ttl: int = 30
 
     # Model Configuration
     llm_model: str = "gpt-3.5-turbo"
     embedding_model: str = "text-embedding-ada-002"
+    # "local" embeds with a sentence-transformers BGE model instead of the OpenAI API
+    embedding_provider: Literal["openai", "local"] = "openai"
+    local_embedding_model: str = "BAAI/bge-small-en-v1.5"
+    local_embedding_device: str = "cuda"
+    local_embedding_batch_size: int = 128
     temperature: float = 0.7
     max_tokens: int = 1000
+    llm_max_concurrency: int = 8
+
+    # Routing Configuration
+    router_model: str = "gpt-4o-mini"
+    router_llm_min_query_length: int = 40
+    routing_cache_size: int = 256
 
     # Search Configuration
     max_search_results: int = 5
     search_timeout: int = 10
+    search_max_concurrency: int = 4
+
+    # Retrieval Configuration
+    search_batch_window_ms: int = 10
+    search_max_batch_size: int = 32
+    embedding_cache_size: int = 512
 
     # Memory Configuration
     memory_window: int = 10
     max_memory_tokens: int = 4000
+    session_idle_ttl: int = 3600
+    session_eviction_interval: int = 300
 
     class Config:
         env_file = ".env"
 
+    @model_validator(mode="after")
+    def _check_api_workers(self) -> "Settings":
+        # Each worker would overwrite the shared FAISS files with only its own vectors
+        if self.api_workers > 1 and self.vector_backend == "faiss":
+            raise ValueError("API_WORKERS > 1 is not supported with VECTOR_BACKEND=faiss")
+        return self
+
 settings = Settings()
\ No newline at end of file
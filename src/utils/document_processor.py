@@ -1,21 +1,91 @@
+import io
 import os
+import csv
+import hashlib
 import logging
-from typing import List, Dict, Any
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator
 from pathlib import Path
-import PyPDF2
-from docx import Document
-import pandas as pd
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.text_splitter import TokenTextSplitter
 from langchain.schema import Document as LangChainDocument
+from src.config.settings import settings
+# Format-specific parsers (pypdfium2, PyPDF2, docx, pyarrow, pandas) are
+# imported inside the extractors so startup only pays for what is used
 
 logger = logging.getLogger(__name__)
 
+# PDFs with fewer pages are extracted in-process; pool startup would dominate
+PARALLEL_PDF_MIN_PAGES = 16
+# Each API worker process gets its own pool, so split the cores between them
+PDF_WORKERS = max(1, (os.cpu_count() or 1) // max(1, settings.api_workers))
+
+# PDFium is not thread-safe, even across documents, so calls made from the
+# API's upload threads are serialized; each pool worker has its own copy
+_PDFIUM_LOCK = threading.Lock()
+
+# Tables are split in blocks of about this many bytes (CSV) or rows (XLSX)
+TABLE_BLOCK_SIZE = 1 << 20
+TABLE_BLOCK_ROWS = 10_000
+
+@lru_cache(maxsize=1)
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Get the process pool used for CPU-bound PDF text extraction."""
+    # Forking the threaded API server could copy locks held by other threads
+    # into the children, so start workers from a clean forkserver (or spawn)
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context(method))
+
+def shutdown_pdf_pool():
+    """Stop the PDF worker processes if the pool was started."""
+    if _get_pdf_pool.cache_info().currsize:
+        _get_pdf_pool().shutdown(cancel_futures=True)
+        _get_pdf_pool.cache_clear()
+
+def _count_pdf_pages(file_path: str) -> int:
+    """Count PDF pages, falling back to PyPDF2 if PDFium cannot open the file."""
+    import pypdfium2 as pdfium
+    with _PDFIUM_LOCK:
+        try:
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+        except pdfium.PdfiumError:
+            pass
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def _extract_pdf_page_range(file_path: str, start: int, stop: int) -> str:
+    """Extract text from pages [start, stop) of a PDF, in-process or in a worker process."""
+    import pypdfium2 as pdfium
+    with _PDFIUM_LOCK:
+        try:
+            # PDFium's native text extraction is much faster than PyPDF2's parser
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                return "".join(pdf[i].get_textpage().get_text_range() + "\n" for i in range(start, stop))
+            finally:
+                pdf.close()
+        except pdfium.PdfiumError as e:
+            logger.warning(f"PDFium failed on {file_path}, falling back to PyPDF2: {str(e)}")
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return "".join(pdf_reader.pages[i].extract_text() + "\n" for i in range(start, stop))
+
 class DocumentProcessor:
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
+        # Chunk by tokens so chunks always fit the embedding model; the text
+        # is encoded once and sliced, rather than re-measured per candidate split
+        self.text_splitter = TokenTextSplitter.from_tiktoken_encoder(
+            encoding_name="cl100k_base",
+            chunk_size=512,
+            chunk_overlap=50,
         )
 
     def process_file(self, file_path: str) -> List[LangChainDocument]:
@@ -23,18 +93,23 @@ class DocumentProcessor:
         try:
             file_extension = Path(file_path).suffix.lower()
             if file_extension == '.pdf':
-                text = self._extract_pdf_text(file_path)
+                chunks = self.text_splitter.split_text(self._extract_pdf_text(file_path))
             elif file_extension == '.docx':
-                text = self._extract_docx_text(file_path)
+                chunks = self.text_splitter.split_text(self._extract_docx_text(file_path))
             elif file_extension == '.txt':
-                text = self._extract_txt_text(file_path)
+                chunks = self.text_splitter.split_text(self._extract_txt_text(file_path))
             elif file_extension in ['.csv', '.xlsx']:
-                text = self._extract_table_text(file_path)
+                # Tables are split one block of rows at a time so the whole
+                # table never exists as a single string
+                chunks = [
+                    chunk
+                    for part in self._iter_table_text(file_path)
+                    for chunk in self.text_splitter.split_text(part)
+                ]
             else:
                 raise ValueError(f"Unsupported file type: {file_extension}")
 
-            # Split text into chunks
-            chunks = self.text_splitter.split_text(text)
+            chunks = self._deduplicate_chunks(chunks)
             
             # Create LangChain documents
             documents = []
@@ -55,17 +130,34 @@ class DocumentProcessor:
             logger.error(f"Error processing file {file_path}: {str(e)}")
             raise
 
+    def _deduplicate_chunks(self, chunks: List[str]) -> List[str]:
+        """Drop chunks whose normalized content was already seen in this file."""
+        seen = set()
+        unique = []
+        for chunk in chunks:
+            content_hash = hashlib.sha1(chunk.strip().lower().encode("utf-8")).digest()
+            if content_hash not in seen:
+                seen.add(content_hash)
+                unique.append(chunk)
+        if len(unique) < len(chunks):
+            logger.info(f"Dropped {len(chunks) - len(unique)} duplicate chunks")
+        return unique
+
     def _extract_pdf_text(self, file_path: str) -> str:
-        """Extract text from PDF file."""
-        text = ""
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+        """Extract text from PDF file, spreading large files across processes."""
+        n_pages = _count_pdf_pages(file_path)
+        if n_pages < PARALLEL_PDF_MIN_PAGES:
+            return _extract_pdf_page_range(file_path, 0, n_pages)
+
+        # One contiguous page range per worker, so each opens the file once
+        step = -(-n_pages // PDF_WORKERS)
+        starts = range(0, n_pages, step)
+        stops = [min(start + step, n_pages) for start in starts]
+        return "".join(_get_pdf_pool().map(_extract_pdf_page_range, [file_path] * len(starts), starts, stops))
 
     def _extract_docx_text(self, file_path: str) -> str:
         """Extract text from DOCX file."""
+        from docx import Document
         doc = Document(file_path)
         text = ""
         for paragraph in doc.paragraphs:
@@ -77,14 +169,40 @@ class DocumentProcessor:
         with open(file_path, 'r', encoding='utf-8') as file:
             return file.read()
 
-    def _extract_table_text(self, file_path: str) -> str:
-        """Extract text from CSV/XLSX files."""
+    def _iter_table_text(self, file_path: str) -> Iterator[str]:
+        """Yield the text of a CSV/XLSX file one block of rows at a time.
+
+        CSV files are also read block by block; XLSX sheets are loaded whole
+        and only split into blocks for the splitter.
+        """
+        header = f"Data from {Path(file_path).name}:\n"
         if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:
-            df = pd.read_excel(file_path)
-        
-        # Convert dataframe to text representation
-        text = f"Data from {Path(file_path).name}:\n"
-        text += df.to_string(index=False)
-        return text
\ No newline at end of file
+            # Only the header line is parsed up front, to name the columns
+            with open(file_path, 'r', encoding='utf-8-sig', newline='') as file:
+                column_names = next(csv.reader(file), None)
+            if not column_names:
+                return
+            # PyArrow parses and re-serializes CSV in vectorized native code.
+            # Columns are read as strings so later blocks cannot fail type
+            # inference made on the first one.
+            import pyarrow as pa
+            import pyarrow.csv as pac
+            read_options = pac.ReadOptions(
+                block_size=TABLE_BLOCK_SIZE, column_names=column_names, skip_rows=1
+            )
+            convert_options = pac.ConvertOptions(
+                column_types={name: pa.string() for name in column_names}
+            )
+            with pac.open_csv(file_path, read_options=read_options, convert_options=convert_options) as reader:
+                for i, batch in enumerate(reader):
+                    buffer = io.BytesIO()
+                    pac.write_csv(batch, buffer, pac.WriteOptions(include_header=i == 0))
+                    yield (header if i == 0 else "") + buffer.getvalue().decode("utf-8")
+            return
+
+        # calamine is a Rust XLSX reader, much faster than openpyxl
+        import pandas as pd
+        df = pd.read_excel(file_path, engine="calamine")
+        for start in range(0, max(len(df), 1), TABLE_BLOCK_ROWS):
+            rows = df.iloc[start:start + TABLE_BLOCK_ROWS].to_csv(index=False, header=start == 0)
+            yield (header if start == 0 else "") + rows
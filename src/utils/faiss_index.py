@@ -0,0 +1,133 @@
+import os
+import json
+import logging
+import threading
+from typing import List, Dict, Any, Tuple
+import numpy as np
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+# HNSW graph parameters: neighbours per node and build/search beam widths
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Vectors collected in a float index before the 8-bit quantizer is trained on
+# them, so its per-dimension ranges come from a representative sample
+QUANTIZE_TRAIN_SIZE = 10_000
+
+class FaissIndex:
+    """In-memory FAISS HNSW index with its documents, persisted to a directory.
+
+    Scores are squared L2 distances, the same scale as Chroma's default
+    metric, so lower means more similar. With `quantize`, the index is
+    rebuilt with 8-bit scalar codes, a quarter of the memory of float32, once
+    it holds QUANTIZE_TRAIN_SIZE vectors to train the quantizer on.
+    """
+    def __init__(self, directory: str, name: str = "documents", quantize: bool = False):
+        import faiss
+        self._faiss = faiss
+        self.name = name
+        self.quantize = quantize
+        self._index_path = os.path.join(directory, f"{name}.faiss")
+        self._docs_path = os.path.join(directory, f"{name}.jsonl")
+        self._lock = threading.Lock()
+        self._index = None
+        # Row i of the index belongs to self._docs[i]
+        self._docs: List[Dict[str, Any]] = []
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self._index_path):
+            self._index = faiss.read_index(self._index_path)
+            self._index.hnsw.efSearch = HNSW_EF_SEARCH
+            with open(self._docs_path, 'r', encoding='utf-8') as file:
+                # The payload file is replaced first on save, so after an
+                # interrupted save it may hold rows the index does not
+                self._docs = [json.loads(line) for line in file][:self._index.ntotal]
+            logger.info(f"Loaded FAISS index with {len(self._docs)} vectors")
+
+    def _configure_hnsw(self, index):
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+
+    def _quantize_index(self):
+        """Rebuild the float index as an 8-bit scalar-quantized one trained on its vectors."""
+        vectors = self._index.reconstruct_n(0, self._index.ntotal)
+        index = self._configure_hnsw(
+            self._faiss.IndexHNSWSQ(vectors.shape[1], self._faiss.ScalarQuantizer.QT_8bit, HNSW_M)
+        )
+        index.train(vectors)
+        index.add(vectors)
+        self._index = index
+        logger.info(f"Rebuilt FAISS index with 8-bit quantization from {len(vectors)} vectors")
+
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+            metadatas: List[Dict[str, Any]]):
+        """Append vectors and their documents; call save() to write them to disk."""
+        vectors = np.asarray(embeddings, dtype="float32")
+        with self._lock:
+            if self._index is None:
+                self._index = self._configure_hnsw(self._faiss.IndexHNSWFlat(vectors.shape[1], HNSW_M))
+            self._index.add(vectors)
+            self._docs.extend(
+                {"id": doc_id, "page_content": text, "metadata": metadata}
+                for doc_id, text, metadata in zip(ids, documents, metadatas)
+            )
+            if (self.quantize and not isinstance(self._index, self._faiss.IndexHNSWSQ)
+                    and self._index.ntotal >= QUANTIZE_TRAIN_SIZE):
+                self._quantize_index()
+
+    def search(self, embedding: List[float], k: int = 5) -> List[Tuple[Document, float]]:
+        """Return the k nearest documents with their distances."""
+        return self.search_batch([embedding], k)[0]
+
+    def search_batch(self, embeddings: List[List[float]], k: int = 5) -> List[List[Tuple[Document, float]]]:
+        """Search several queries in one index call, returning one result list per query."""
+        with self._lock:
+            if self._index is None or not self._docs:
+                return [[] for _ in embeddings]
+            queries = np.asarray(embeddings, dtype="float32")
+            distances, rows = self._index.search(queries, min(k, len(self._docs)))
+            docs = self._docs
+        return [
+            [
+                (Document(page_content=docs[row]["page_content"], metadata=docs[row]["metadata"]), float(distance))
+                for distance, row in zip(query_distances, query_rows)
+                if row != -1
+            ]
+            for query_distances, query_rows in zip(distances, rows)
+        ]
+
+    def count(self) -> int:
+        """Number of stored vectors."""
+        return len(self._docs)
+
+    def save(self):
+        """Write the index and documents to disk, replacing each file atomically."""
+        with self._lock:
+            if self._index is None:
+                return
+            # Snapshot under the lock, write outside it so searches keep running
+            index_bytes = self._faiss.serialize_index(self._index).tobytes()
+            docs = list(self._docs)
+        self._write_atomic(self._docs_path, "".join(json.dumps(doc) + "\n" for doc in docs).encode("utf-8"))
+        self._write_atomic(self._index_path, index_bytes)
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        """Remove all vectors and delete the persisted files."""
+        with self._lock:
+            self._index = None
+            self._docs = []
+            for path in (self._index_path, self._docs_path):
+                if os.path.exists(path):
+                    os.remove(path)
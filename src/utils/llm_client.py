@@ -0,0 +1,43 @@
+import asyncio
+from functools import lru_cache
+from typing import TYPE_CHECKING
+from src.config.settings import settings
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+# Caps in-flight OpenAI requests (chat and embeddings) to stay under the rate limit
+LLM_SEMAPHORE = asyncio.Semaphore(settings.llm_max_concurrency)
+
+# The OpenAI stack is imported on first use to keep cold start fast.
+
+@lru_cache(maxsize=1)
+def get_http_async_client() -> "httpx.AsyncClient":
+    """Get the pooled async HTTP client shared by every ChatOpenAI instance."""
+    import httpx
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+
+@lru_cache(maxsize=1)
+def get_llm() -> "ChatOpenAI":
+    """Get the shared chat model used by all agents."""
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        openai_api_key=settings.openai_api_key,
+        model_name=settings.llm_model,
+        temperature=settings.temperature,
+        http_async_client=get_http_async_client()
+    )
+
+@lru_cache(maxsize=1)
+def get_router_llm() -> "ChatOpenAI":
+    """Get the smaller model used only when the routing heuristics are inconclusive."""
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        openai_api_key=settings.openai_api_key,
+        model_name=settings.router_model,
+        temperature=0,
+        http_async_client=get_http_async_client()
+    )
@@ -1,11 +1,16 @@
+import time
 import logging
-from typing import List, Dict, Any, Optional
+from collections import deque
+from typing import List, Dict, Any, Optional, Deque
 from langchain.memory import ConversationBufferWindowMemory
-from langchain.schema import BaseMessage, HumanMessage, AIMessage
+from langchain.schema import BaseMessage
 from src.config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Messages kept per session: the memory window is counted in exchanges
+HISTORY_LIMIT = settings.memory_window * 2
+
 class ConversationMemoryManager:
     def __init__(self, session_id: str):
         self.session_id = session_id
@@ -14,17 +19,27 @@ class ConversationMemoryManager:
             return_messages=True,
             memory_key="chat_history"
         )
-        self._message_history: List[Dict[str, Any]] = []
+        # Stored history is trimmed to HISTORY_LIMIT messages, so long-running
+        # sessions stay bounded; _message_count keeps the full total
+        self._message_history: Deque[Dict[str, Any]] = deque(maxlen=HISTORY_LIMIT)
+        self._message_count = 0
+        # Monotonic time of the last message, used for idle eviction
+        self.last_activity = time.monotonic()
+        # Formatted transcript lines, appended as messages arrive and bounded
+        # like the stored history so both cover the same window
+        self._formatted_cache: Deque[str] = deque(maxlen=HISTORY_LIMIT)
 
     def add_user_message(self, message: str):
         """Add user message to memory."""
         try:
             self.memory.chat_memory.add_user_message(message)
+            self._formatted_cache.append(f"Human: {message}\n")
             self._message_history.append({
                 "type": "human",
                 "content": message,
                 "timestamp": self._get_timestamp()
             })
+            self._record_message()
             logger.debug(f"Added user message to memory for session {self.session_id}")
         except Exception as e:
             logger.error(f"Error adding user message to memory: {str(e)}")
@@ -33,15 +48,25 @@ class ConversationMemoryManager:
         """Add AI response to memory."""
         try:
             self.memory.chat_memory.add_ai_message(message)
+            self._formatted_cache.append(f"Assistant: {message}\n")
             self._message_history.append({
                 "type": "ai",
                 "content": message,
                 "timestamp": self._get_timestamp()
             })
+            self._record_message()
             logger.debug(f"Added AI message to memory for session {self.session_id}")
         except Exception as e:
             logger.error(f"Error adding AI message to memory: {str(e)}")
 
+    def _record_message(self):
+        """Drop messages beyond the window and update the activity counters."""
+        messages = self.memory.chat_memory.messages
+        if len(messages) > HISTORY_LIMIT:
+            del messages[:-HISTORY_LIMIT]
+        self._message_count += 1
+        self.last_activity = time.monotonic()
+
     def get_conversation_history(self) -> List[BaseMessage]:
         """Get conversation history as LangChain messages."""
         try:
@@ -52,24 +77,15 @@ class ConversationMemoryManager:
 
     def get_formatted_history(self) -> str:
         """Get formatted conversation history as string."""
-        try:
-            messages = self.get_conversation_history()
-            formatted_history = ""
-            for message in messages:
-                if isinstance(message, HumanMessage):
-                    formatted_history += f"Human: {message.content}\n"
-                elif isinstance(message, AIMessage):
-                    formatted_history += f"Assistant: {message.content}\n"
-            return formatted_history
-        except Exception as e:
-            logger.error(f"Error formatting conversation history: {str(e)}")
-            return ""
+        return "".join(self._formatted_cache)
 
     def clear_memory(self):
         """Clear conversation memory."""
         try:
             self.memory.clear()
-            self._message_history = []
+            self._message_history.clear()
+            self._message_count = 0
+            self._formatted_cache.clear()
             logger.info(f"Cleared memory for session {self.session_id}")
         except Exception as e:
             logger.error(f"Error clearing memory: {str(e)}")
@@ -91,7 +107,7 @@ class ConversationMemoryManager:
         """Get summary of current session."""
         return {
             "session_id": self.session_id,
-            "message_count": len(self._message_history),
+            "message_count": self._message_count,
             "last_activity": self._message_history[-1]["timestamp"] if self._message_history else None
         }
 
@@ -116,5 +132,18 @@ class MemoryStore:
         """Get list of active session IDs."""
         return list(self._sessions.keys())
 
+    def evict_idle_sessions(self, max_idle_seconds: float) -> List[str]:
+        """Drop sessions with no activity for max_idle_seconds and return their IDs."""
+        cutoff = time.monotonic() - max_idle_seconds
+        idle = [
+            session_id for session_id, memory in list(self._sessions.items())
+            if memory.last_activity < cutoff
+        ]
+        for session_id in idle:
+            self._sessions.pop(session_id, None)
+        if idle:
+            logger.info(f"Evicted {len(idle)} idle sessions")
+        return idle
+
 # Global memory store instance
 memory_store = MemoryStore()
\ No newline at end of file
@@ -0,0 +1,32 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+def normalize_query_key(query: str) -> str:
+    """Build a cache key from a query, ignoring case and whitespace differences."""
+    normalized = " ".join(query.lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+class LRUCache:
+    """Small least-recently-used cache backed by an OrderedDict."""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Return the cached value and mark it as recently used."""
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full."""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all cached entries."""
+        self._data.clear()
\ No newline at end of file
@@ -1,45 +1,274 @@
 import os
+import re
+import uuid
+import atexit
+import asyncio
+import hashlib
 import logging
-from typing import List, Optional, Dict, Any
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from langchain.vectorstores import Chroma
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Set, Tuple, TYPE_CHECKING
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.schema import Document
+from src.utils.llm_client import LLM_SEMAPHORE
+from src.utils.query_cache import LRUCache, normalize_query_key
 from src.config.settings import settings
 
+if TYPE_CHECKING:
+    from src.utils.faiss_index import FaissIndex
+
 logger = logging.getLogger(__name__)
 
+# Number of chunks embedded and inserted per request to the vector store
+ADD_BATCH_SIZE = 256
+
+class ContentHashIndex:
+    """SQLite map from chunk content hash to the id of the stored embedding."""
+    def __init__(self, db_path: str):
+        # Uploads run in worker threads, so share one connection behind a lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache (hash TEXT PRIMARY KEY, id TEXT NOT NULL)"
+            )
+
+    @staticmethod
+    def hash_content(content: str) -> str:
+        """Hash chunk text for the cache lookup."""
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def lookup(self, hashes: List[str]) -> Dict[str, str]:
+        """Return the stored ids for the hashes that are already embedded."""
+        found: Dict[str, str] = {}
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT hash, id FROM embedding_cache WHERE hash IN ({placeholders})", chunk
+                )
+                found.update(rows)
+        return found
+
+    def store(self, entries: Dict[str, str]):
+        """Record hash -> id for newly inserted chunks."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (hash, id) VALUES (?, ?)", entries.items()
+            )
+
+    def clear(self):
+        """Forget all cached hashes."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embedding_cache")
+
+def _create_embeddings():
+    """Create the embedding model configured by settings.embedding_provider."""
+    if settings.embedding_provider == "local":
+        from langchain_community.embeddings import HuggingFaceBgeEmbeddings
+        return HuggingFaceBgeEmbeddings(
+            model_name=settings.local_embedding_model,
+            model_kwargs={"device": settings.local_embedding_device},
+            encode_kwargs={
+                "batch_size": settings.local_embedding_batch_size,
+                "normalize_embeddings": True
+            }
+        )
+    return OpenAIEmbeddings(
+        openai_api_key=settings.openai_api_key,
+        model=settings.embedding_model
+    )
+
+def _embedding_model_name() -> str:
+    """Name of the configured embedding model, recorded with the collection."""
+    if settings.embedding_provider == "local":
+        return settings.local_embedding_model
+    return settings.embedding_model
+
+def _backend_directory() -> str:
+    """Directory holding the configured backend's data."""
+    if settings.vector_backend == "faiss":
+        return os.path.join(settings.vector_db_path, "faiss")
+    return settings.vector_db_path
+
 class VectorStoreManager:
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=settings.openai_api_key,
-            model=settings.embedding_model
-        )
+        # Documents and queries must share one embedding space, so the same
+        # model embeds both
+        self.embeddings = _create_embeddings()
         self.vector_store = None
+        # Set instead of vector_store when settings.vector_backend == "faiss"
+        self.faiss_index: Optional["FaissIndex"] = None
         self._initialize_vector_store()
+        # Cached ids are only valid for the store and model that produced them,
+        # so each backend directory keeps one hash DB per embedding model
+        model_slug = re.sub(r"[^A-Za-z0-9.-]+", "_", _embedding_model_name())
+        self.content_hash_index = ContentHashIndex(
+            os.path.join(_backend_directory(), f"embedding_cache_{model_slug}.sqlite3")
+        )
+        # Serializes collection writes coming from concurrent upload threads
+        self._write_lock = threading.Lock()
+        # Set when the FAISS index has inserts not yet written by save_index
+        self._index_dirty = False
+        if self.faiss_index is not None:
+            atexit.register(self.save_index)
+        # (timestamp, info) of the last collection lookup; reset on writes
+        self._collection_info_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+        # Query embeddings keyed on the normalized query
+        self._query_embedding_cache = LRUCache(settings.embedding_cache_size)
+        # Concurrent async searches from all sessions are coalesced by _search_dispatcher
+        self._search_queue: Optional[asyncio.Queue] = None
+        self._search_dispatcher_task: Optional[asyncio.Task] = None
+        # Strong references to in-flight batches, which asyncio only holds weakly
+        self._search_batch_tasks: Set[asyncio.Task] = set()
 
     def _initialize_vector_store(self):
-        """Initialize ChromaDB vector store."""
+        """Initialize the configured vector store backend."""
         try:
             os.makedirs(settings.vector_db_path, exist_ok=True)
+            # Backends are imported here so only the configured one is loaded
+            if settings.vector_backend == "faiss":
+                from src.utils.faiss_index import FaissIndex
+                self.faiss_index = FaissIndex(
+                    _backend_directory(),
+                    quantize=settings.faiss_int8_quantization
+                )
+                logger.info("FAISS vector store initialized successfully")
+                return
+            from langchain.vectorstores import Chroma
+            # chromadb >= 0.4 writes through to persist_directory on every
+            # insert, so no explicit persist() call is needed
             self.vector_store = Chroma(
                 persist_directory=settings.vector_db_path,
                 embedding_function=self.embeddings,
-                collection_name="documents"
+                collection_name="documents",
+                collection_metadata={"embedding_model": _embedding_model_name()}
             )
+            stored_model = (self.vector_store._collection.metadata or {}).get("embedding_model")
+            if stored_model and stored_model != _embedding_model_name():
+                raise ValueError(
+                    f"Collection was embedded with {stored_model}, but {_embedding_model_name()} "
+                    "is configured; clear the collection or switch the embedding settings back"
+                )
             logger.info("Vector store initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing vector store: {str(e)}")
             raise
 
+    def _plan_insert(
+        self, documents: List[Document]
+    ) -> Tuple[List[str], Dict[str, str], List[Tuple[str, str, Document]]]:
+        """Hash documents and split them into cached ids and chunks still to embed.
+
+        Returns the per-document hashes, an id for every distinct hash and the
+        pending (hash, id, document) entries that need an embedding.
+        """
+        hashes = [ContentHashIndex.hash_content(doc.page_content) for doc in documents]
+        ids_by_hash = self.content_hash_index.lookup(list(set(hashes)))
+        pending = []
+        for content_hash, doc in zip(hashes, documents):
+            # Each distinct content is embedded once, even if repeated in the upload
+            if content_hash not in ids_by_hash:
+                ids_by_hash[content_hash] = str(uuid.uuid4())
+                pending.append((content_hash, ids_by_hash[content_hash], doc))
+        return hashes, ids_by_hash, pending
+
+    def _insert_batch(
+        self, batch: List[Tuple[str, str, Document]], embeddings: List[List[float]]
+    ) -> Dict[str, str]:
+        """Write one batch of embedded chunks and record their hashes.
+
+        Chunks that a concurrent upload stored after planning are skipped;
+        their hash -> stored id mapping is returned so callers use those ids.
+        """
+        with self._write_lock:
+            inserted_since = self.content_hash_index.lookup([content_hash for content_hash, _, _ in batch])
+            rows = [
+                (entry, embedding) for entry, embedding in zip(batch, embeddings)
+                if entry[0] not in inserted_since
+            ]
+            if rows:
+                store = self.faiss_index if self.faiss_index is not None else self.vector_store._collection
+                store.add(
+                    ids=[doc_id for (_, doc_id, _), _ in rows],
+                    embeddings=[embedding for _, embedding in rows],
+                    documents=[doc.page_content for (_, _, doc), _ in rows],
+                    metadatas=[doc.metadata for (_, _, doc), _ in rows]
+                )
+                self.content_hash_index.store({content_hash: doc_id for (content_hash, doc_id, _), _ in rows})
+                self._collection_info_cache = None
+                self._index_dirty = self.faiss_index is not None
+            return inserted_since
+
+    def save_index(self):
+        """Write pending FAISS inserts to disk; Chroma persists on its own.
+
+        Saving rewrites the whole index, so it runs periodically and at
+        shutdown rather than after every upload.
+        """
+        with self._write_lock:
+            if self.faiss_index is None or not self._index_dirty:
+                return
+            self.faiss_index.save()
+            self._index_dirty = False
+
     def add_documents(self, documents: List[Document]) -> List[str]:
-        """Add documents to vector store."""
+        """Add documents to vector store, skipping chunks that are already embedded."""
+        try:
+            hashes, ids_by_hash, pending = self._plan_insert(documents)
+            for start in range(0, len(pending), ADD_BATCH_SIZE):
+                batch = pending[start:start + ADD_BATCH_SIZE]
+                embeddings = self.embeddings.embed_documents([doc.page_content for _, _, doc in batch])
+                ids_by_hash.update(self._insert_batch(batch, embeddings))
+            logger.info(
+                f"Added {len(documents)} documents to vector store "
+                f"({len(pending)} embedded, {len(documents) - len(pending)} cached)"
+            )
+            return [ids_by_hash[content_hash] for content_hash in hashes]
+        except Exception as e:
+            logger.error(f"Error adding documents to vector store: {str(e)}")
+            raise
+
+    async def aembed_batches(
+        self, texts: List[str], batch: int = 1000, concurrency: int = 10
+    ) -> List[List[float]]:
+        """Embed texts in slices of `batch`, with up to `concurrency` requests in flight.
+
+        Requests also count against LLM_SEMAPHORE, shared with chat traffic.
+        """
+        if settings.embedding_provider == "local":
+            # The local model batches on the GPU itself; parallel calls would only contend
+            return await asyncio.to_thread(self.embeddings.embed_documents, texts)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def embed_slice(start: int) -> List[List[float]]:
+            # The global cap also applies, so uploads stay within the shared rate limit
+            async with semaphore, LLM_SEMAPHORE:
+                return await self.embeddings.aembed_documents(texts[start:start + batch])
+
+        slices = await asyncio.gather(*(embed_slice(start) for start in range(0, len(texts), batch)))
+        return [embedding for embeddings in slices for embedding in embeddings]
+
+    async def aadd_documents(self, documents: List[Document]) -> List[str]:
+        """Async add_documents that embeds new chunks with concurrent requests."""
         try:
-            ids = self.vector_store.add_documents(documents)
-            self.vector_store.persist()
-            logger.info(f"Added {len(documents)} documents to vector store")
-            return ids
+            hashes, ids_by_hash, pending = await asyncio.to_thread(self._plan_insert, documents)
+            embeddings = await self.aembed_batches([doc.page_content for _, _, doc in pending])
+            for start in range(0, len(pending), ADD_BATCH_SIZE):
+                ids_by_hash.update(await asyncio.to_thread(
+                    self._insert_batch,
+                    pending[start:start + ADD_BATCH_SIZE],
+                    embeddings[start:start + ADD_BATCH_SIZE]
+                ))
+            logger.info(
+                f"Added {len(documents)} documents to vector store "
+                f"({len(pending)} embedded, {len(documents) - len(pending)} cached)"
+            )
+            return [ids_by_hash[content_hash] for content_hash in hashes]
         except Exception as e:
             logger.error(f"Error adding documents to vector store: {str(e)}")
             raise
@@ -47,7 +276,11 @@ class VectorStoreManager:
     def similarity_search(self, query: str, k: int = 5) -> List[Document]:
         """Perform similarity search in vector store."""
         try:
-            results = self.vector_store.similarity_search(query, k=k)
+            if self.faiss_index is not None:
+                query_embedding = self.embeddings.embed_query(query)
+                results = [doc for doc, _ in self.faiss_index.search(query_embedding, k=k)]
+            else:
+                results = self.vector_store.similarity_search(query, k=k)
             logger.info(f"Found {len(results)} similar documents for query")
             return results
         except Exception as e:
@@ -57,30 +290,156 @@ class VectorStoreManager:
     def similarity_search_with_score(self, query: str, k: int = 5) -> List[tuple]:
         """Perform similarity search with relevance scores."""
         try:
-            results = self.vector_store.similarity_search_with_score(query, k=k)
+            if self.faiss_index is not None:
+                results = self.faiss_index.search(self.embeddings.embed_query(query), k=k)
+            else:
+                results = self.vector_store.similarity_search_with_score(query, k=k)
             logger.info(f"Found {len(results)} documents with scores")
             return results
         except Exception as e:
             logger.error(f"Error performing similarity search with scores: {str(e)}")
             return []
 
+    def similarity_search_by_vectors_with_score(
+        self, embeddings: List[List[float]], k: int = 5
+    ) -> List[List[tuple]]:
+        """Search several query embeddings in one vector store call."""
+        if self.faiss_index is not None:
+            return self.faiss_index.search_batch(embeddings, k=k)
+        results = self.vector_store._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (Document(page_content=text, metadata=metadata or {}), distance)
+                for text, metadata, distance in zip(texts, metadatas, distances)
+            ]
+            for texts, metadatas, distances in zip(
+                results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 5) -> List[tuple]:
+        """Similarity search with scores, batched with other concurrent searches."""
+        if self._search_dispatcher_task is None or self._search_dispatcher_task.done():
+            self._search_queue = asyncio.Queue()
+            self._search_dispatcher_task = asyncio.create_task(self._search_dispatcher())
+        future = asyncio.get_running_loop().create_future()
+        await self._search_queue.put((query, k, future))
+        return await future
+
+    async def _search_dispatcher(self):
+        """Collect queued searches for a short window and run them as one batch."""
+        loop = asyncio.get_running_loop()
+        window = settings.search_batch_window_ms / 1000
+        while True:
+            batch = [await self._search_queue.get()]
+            deadline = loop.time() + window
+            while len(batch) < settings.search_max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._search_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Run batches concurrently so one slow embedding call does not
+            # hold up retrieval for every other session
+            task = asyncio.create_task(self._run_search_batch(batch))
+            self._search_batch_tasks.add(task)
+            task.add_done_callback(self._search_batch_tasks.discard)
+
+    async def _run_search_batch(self, batch: List[tuple]):
+        """Embed and search all queries of a batch at once and resolve each caller's future."""
+        try:
+            embeddings = await self._embed_queries([query for query, _, _ in batch])
+            max_k = max(k for _, k, _ in batch)
+            results = await asyncio.to_thread(
+                self.similarity_search_by_vectors_with_score, embeddings, k=max_k
+            )
+            results = [result[:k] for result, (_, k, _) in zip(results, batch)]
+            if len(batch) > 1:
+                logger.info(f"Served {len(batch)} similarity searches in one batch")
+        except Exception as e:
+            logger.error(f"Error in batched similarity search: {str(e)}")
+            results = [[] for _ in batch]
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed queries, calling the embedding model only for uncached ones."""
+        keys = [normalize_query_key(query) for query in queries]
+        vectors_by_key = {}
+        missing = {}
+        for key, query in zip(keys, queries):
+            vector = self._query_embedding_cache.get(key)
+            if vector is not None:
+                vectors_by_key[key] = vector
+            else:
+                missing[key] = query
+        if missing:
+            if settings.embedding_provider == "local":
+                # embed_query adds the BGE retrieval instruction, and the local
+                # model is not subject to the OpenAI rate limit
+                vectors = await asyncio.gather(*(
+                    self.embeddings.aembed_query(query) for query in missing.values()
+                ))
+            else:
+                async with LLM_SEMAPHORE:
+                    vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            for key, vector in zip(missing, vectors):
+                self._query_embedding_cache.set(key, vector)
+                vectors_by_key[key] = vector
+        return [vectors_by_key[key] for key in keys]
+
     def delete_collection(self):
         """Delete the entire collection."""
         try:
-            self.vector_store.delete_collection()
+            with self._write_lock:
+                if self.faiss_index is not None:
+                    self.faiss_index.reset()
+                    self._index_dirty = False
+                else:
+                    self.vector_store.delete_collection()
+                self.content_hash_index.clear()
+                self._collection_info_cache = None
             logger.info("Vector store collection deleted")
         except Exception as e:
             logger.error(f"Error deleting collection: {str(e)}")
 
-    def get_collection_info(self) -> Dict[str, Any]:
-        """Get information about the current collection."""
+    def get_collection_info(self, max_age: float = 0) -> Dict[str, Any]:
+        """Get information about the current collection.
+
+        A result up to `max_age` seconds old is served from cache.
+        """
+        now = time.monotonic()
+        cached = self._collection_info_cache
+        if cached is not None and now - cached[0] < max_age:
+            return cached[1]
         try:
-            collection = self.vector_store._collection
-            return {
-                "name": collection.name,
-                "count": collection.count(),
-                "metadata": collection.metadata
-            }
+            if self.faiss_index is not None:
+                info = {
+                    "name": self.faiss_index.name,
+                    "count": self.faiss_index.count(),
+                    "metadata": {"backend": "faiss", "embedding_model": _embedding_model_name()}
+                }
+            else:
+                collection = self.vector_store._collection
+                info = {
+                    "name": collection.name,
+                    "count": collection.count(),
+                    "metadata": collection.metadata
+                }
+            self._collection_info_cache = (now, info)
+            return info
         except Exception as e:
             logger.error(f"Error getting collection info: {str(e)}")
-            return {}
\ No newline at end of file
+            return {}
+
+@lru_cache(maxsize=1)
+def get_vector_store() -> VectorStoreManager:
+    """Get the process-wide vector store manager, so the index is loaded once."""
+    return VectorStoreManager()
\ No newline at end of file